@@ -0,0 +1,61 @@
+import base64
+import hashlib
+import hmac
+import time
+from typing import Any, Optional, Union
+
+import jwt
+import orjson
+
+# Token helpers on the per-request auth path. This module is kept free of Flask
+# so it can be compiled with mypyc (see the Dockerfile); it also runs as plain Python.
+
+JWT_ALGORITHM = "HS256"
+
+# Extract a Bearer token from an Authorization header value
+def parse_bearer_token(auth_header: Optional[str]) -> Optional[str]:
+    if not auth_header:
+        return None
+    scheme, sep, token = auth_header.partition(" ")
+    if not sep or scheme != "Bearer":
+        return None
+    return token
+
+# Decode a base64url segment, restoring the stripped padding
+def base64url_decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+# Verify an HS256 token and return its claims, raising PyJWT's exception types
+def verify_hs256(token: str, key: bytes, verify_exp: bool = True) -> dict[str, Any]:
+    try:
+        header_b64, payload_b64, signature_b64 = token.split(".")
+        header = orjson.loads(base64url_decode(header_b64))
+        signature = base64url_decode(signature_b64)
+    except ValueError as error:
+        raise jwt.DecodeError("Invalid token encoding") from error
+    if not isinstance(header, dict) or header.get("alg") != JWT_ALGORITHM:
+        raise jwt.InvalidAlgorithmError("The specified alg value is not allowed")
+    expected = hmac.new(key, f"{header_b64}.{payload_b64}".encode(), hashlib.sha256).digest()
+    if not hmac.compare_digest(expected, signature):
+        raise jwt.InvalidSignatureError("Signature verification failed")
+    try:
+        decoded = orjson.loads(base64url_decode(payload_b64))
+    except ValueError as error:
+        raise jwt.DecodeError("Invalid payload encoding") from error
+    if not isinstance(decoded, dict):
+        raise jwt.DecodeError("Invalid payload string: must be a json object")
+    if verify_exp and "exp" in decoded:
+        try:
+            exp = int(decoded["exp"])
+        except (TypeError, ValueError) as error:
+            raise jwt.DecodeError("Expiration Time claim (exp) must be an integer.") from error
+        if exp <= time.time():
+            raise jwt.ExpiredSignatureError("Signature has expired")
+    return decoded
+
+# Identify a token by its jti claim, falling back to a 16-byte digest
+def blacklist_key(token: str, decoded: dict[str, Any]) -> Union[str, bytes]:
+    jti = decoded.get("jti")
+    if isinstance(jti, str) and jti:
+        return jti
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
@@ -0,0 +1,7 @@
+# Loaded automatically by gunicorn when started from this directory.
+
+# Start the logging queue listener in each worker once the app is loaded;
+# threads do not survive the fork, so this cannot happen in the master.
+def post_worker_init(worker):
+    from index import configure_logging
+    configure_logging()
@@ -1,107 +1,250 @@
-import functools
+import atexit
+import hashlib
 import json
-import subprocess
+import logging
+import queue
+import threading
+import time
 import jwt
+import orjson
 import os
-from flask import Flask, request, jsonify
-from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Optional, Union
+from cachetools import TLRUCache, TTLCache
+from flask import Flask, Request, Response, g, request
+from auth import JWT_ALGORITHM, blacklist_key, parse_bearer_token, verify_hs256
+
+log = logging.getLogger(__name__)
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# Route this module's records through a queue so request handlers never block on
+# log I/O; the listener thread owns the real handler. Called at startup (see
+# gunicorn.conf.py), not on import.
+def configure_logging(handler: Optional[logging.Handler] = None) -> QueueListener:
+    if handler is None:
+        handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    log.addHandler(QueueHandler(log_queue))
+    log.propagate = False
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
 
 # Helper Functions
 def generate_secret_key():
     return os.urandom(64).hex()
 
+# Constants
+TOKEN_EXPIRATION_TIME = 60 * 60  # 1-hour token expiration, in seconds
+TOKEN_BLACKLIST_SIZE = 100000
+JWT_CACHE_SIZE = 10000
+JWT_CACHE_TTL = 300  # seconds
+STATUS_UNAUTHORIZED = 401
+STATUS_FORBIDDEN = 403
+STATUS_UNAVAILABLE = 503
+MISSING_TOKEN_MSG = "Unauthorized: Missing token"
+TOKEN_EXPIRED_MSG = "Unauthorized: Token expired"
+TOKEN_REUSED_MSG = "Forbidden: Token has already been used"
+INVALID_TOKEN_MSG = "Forbidden: Invalid token"
+BLACKLIST_FULL_MSG = "Service Unavailable: Too many unexpired used tokens"
+
+# Error bodies for the static auth failures, serialized once
+MISSING_TOKEN_BODY = orjson.dumps({"error": MISSING_TOKEN_MSG})
+TOKEN_EXPIRED_BODY = orjson.dumps({"error": TOKEN_EXPIRED_MSG})
+TOKEN_REUSED_BODY = orjson.dumps({"error": TOKEN_REUSED_MSG})
+INVALID_TOKEN_BODY = orjson.dumps({"error": INVALID_TOKEN_MSG})
+BLACKLIST_FULL_BODY = orjson.dumps({"error": BLACKLIST_FULL_MSG})
+
 # State Variables
-current_secret_key = generate_secret_key()
+# One signing key per process; set JWT_SECRET_KEY to share it across workers.
+# Kept as bytes so the HMAC key is not re-encoded on every verify.
+current_secret_key = (os.environ.get("JWT_SECRET_KEY") or generate_secret_key()).encode()
 current_token = None
-token_blacklist = set()
+# Used tokens only need remembering until they expire. The cache must never evict an
+# unexpired entry (that would make the token replayable), so once it holds
+# TOKEN_BLACKLIST_SIZE live entries single-use endpoints refuse tokens until some expire.
+token_blacklist: TTLCache[Union[str, bytes], bool] = TTLCache(maxsize=TOKEN_BLACKLIST_SIZE, ttl=TOKEN_EXPIRATION_TIME)
+token_blacklist_lock = threading.Lock()
 
-# Constants
-CACHE_DURATION_MS = 5 * 60 * 1000  # 5 minutes
-TOKEN_EXPIRATION_TIME = '1h'  # 1-hour token expiration
-ERROR_MESSAGES = {
-    "MISSING_TOKEN": "Unauthorized: Missing token",
-    "TOKEN_EXPIRED": "Unauthorized: Token expired",
-    "TOKEN_REUSED": "Forbidden: Token has already been used",
-    "INVALID_TOKEN": "Forbidden: Invalid token",
-}
-RESPONSE_STATUS = {
-    "UNAUTHORIZED": 401,
-    "FORBIDDEN": 403,
-}
-
-# Cached Configuration
-config_cache = {
-    "metadata": None,
-    "sha": None,
-    "last_updated": 0,
-}
-
-# Extract token from request headers
-def extract_auth_token(req):
-    auth_header = req.headers.get("Authorization")
-    return auth_header.split(" ")[1] if auth_header else None
+# Extract a Bearer token from request headers
+def extract_auth_token(req: Request) -> Optional[str]:
+    return parse_bearer_token(req.headers.get("Authorization"))
+
+# Serialize a JSON response body with orjson
+def json_response(obj: Any, status_code: int = 200) -> Response:
+    return app.response_class(orjson.dumps(obj), status=status_code, mimetype="application/json")
 
 # Send a standardized error response
-def send_error_response(res, status_code, message):
-    print(message)
-    response = jsonify({"error": message})
-    response.status_code = status_code
-    return response
+def send_error_response(res: Request, status_code: int, message: str, body: Optional[bytes] = None) -> Response:
+    log.warning(message)
+    if body is None:
+        return json_response({"error": message}, status_code)
+    return app.response_class(body, status=status_code, mimetype="application/json")
 
-# Load configuration with cache control
-def load_configuration():
-    current_timestamp = int(datetime.now().timestamp() * 1000)
-    if config_cache["metadata"] and (current_timestamp - config_cache["last_updated"]) < CACHE_DURATION_MS:
-        return config_cache
+# Find the git directory for `start`, following a `.git` file (worktrees, submodules)
+def find_git_dir(start):
+    directory = start
+    while True:
+        dot_git = os.path.join(directory, ".git")
+        if os.path.isdir(dot_git):
+            return dot_git
+        if os.path.isfile(dot_git):
+            with open(dot_git, "r") as f:
+                line = f.readline().strip()
+            if not line.startswith("gitdir: "):
+                return None
+            return os.path.normpath(os.path.join(directory, line[len("gitdir: "):]))
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+# Read HEAD from a git directory; branch refs live in the common dir for worktrees
+def read_git_sha(git_dir):
+    common_dir = git_dir
+    commondir_path = os.path.join(git_dir, "commondir")
+    if os.path.isfile(commondir_path):
+        with open(commondir_path, "r") as f:
+            common_dir = os.path.normpath(os.path.join(git_dir, f.read().strip()))
+    with open(os.path.join(git_dir, "HEAD"), "r") as f:
+        head = f.read().strip()
+    if not head.startswith("ref: "):
+        return head
+    ref = head[len("ref: "):]
+    for ref_dir in (git_dir, common_dir):
+        ref_path = os.path.join(ref_dir, ref)
+        if os.path.isfile(ref_path):
+            with open(ref_path, "r") as f:
+                return f.read().strip()
+    packed_refs_path = os.path.join(common_dir, "packed-refs")
+    if os.path.isfile(packed_refs_path):
+        with open(packed_refs_path, "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2 and parts[1] == ref:
+                    return parts[0]
+    return None
+
+# Resolve the git commit SHA without spawning a subprocess
+def get_git_sha():
+    sha = os.environ.get("GIT_SHA")
+    if sha:
+        return sha.strip()
     try:
-        with open("./metadata.json", "r") as f:
-            metadata_content = f.read()
-        metadata = json.loads(metadata_content)
-        sha = get_git_sha()
-        config_cache.update({"metadata": metadata, "sha": sha, "last_updated": current_timestamp})
-        return config_cache
-    except Exception as error:
-        print("Configuration loading failed:", error)
+        git_dir = find_git_dir(os.getcwd())
+        return read_git_sha(git_dir) if git_dir else None
+    except OSError as error:
+        log.error("Git SHA lookup failed: %s", error)
+        return None
+
+# Parse metadata.json straight from the file object
+def load_metadata():
+    try:
+        with open("./metadata.json", "rb") as f:
+            return json.load(f)
+    except (OSError, ValueError) as error:
+        log.error("Metadata loading failed: %s", error)
+        return None
+
+# Metadata, commit SHA and build number are fixed for the lifetime of the process
+METADATA = load_metadata()
+_GIT_SHA = get_git_sha()
+BUILD_NUMBER = os.environ.get("BUILD_NUMBER", "0")
+VERSION_STRING = f"{METADATA['version']}-{BUILD_NUMBER}" if METADATA and "version" in METADATA else None
+
+# Return the configuration resolved at import
+def load_configuration():
+    if METADATA is None or VERSION_STRING is None or not _GIT_SHA:
         raise Exception("Failed to load configuration")
+    return {"metadata": METADATA, "version": VERSION_STRING, "sha": _GIT_SHA}
 
-# Use subprocess to fetch the git commit SHA
-def get_git_sha():
+# Serialize the /status body once, since none of its inputs change at runtime
+def build_status_body():
     try:
-        result = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True)
-        return result.stdout.strip()
-    except subprocess.CalledProcessError as error:
-        raise error
+        config = load_configuration()
+        return orjson.dumps({
+            "my-application": [
+                {
+                    "description": config["metadata"]["description"],
+                    "version": config["version"],
+                    "sha": config["sha"],
+                }
+            ],
+        })
+    except Exception as error:
+        log.error("Configuration loading failed: %s", error)
+        return None
+
+STATUS_BODY = build_status_body()
+
+# Cache decoded claims until the token expires, capped at JWT_CACHE_TTL
+def jwt_cache_ttu(key: bytes, decoded: dict[str, Any], now: float) -> float:
+    exp = decoded.get("exp")
+    ttl = JWT_CACHE_TTL if exp is None else min(JWT_CACHE_TTL, exp - time.time())
+    return now + ttl
+
+jwt_cache = TLRUCache(maxsize=JWT_CACHE_SIZE, ttu=jwt_cache_ttu)
+jwt_cache_lock = threading.Lock()
+
+# Decode a token, reusing claims that were already verified
+def decode_token(token: str) -> dict[str, Any]:
+    key = hashlib.sha256(token.encode()).digest()
+    with jwt_cache_lock:
+        decoded = jwt_cache.get(key)
+    if decoded is None:
+        decoded = verify_hs256(token, current_secret_key)
+        with jwt_cache_lock:
+            jwt_cache[key] = decoded
+    return decoded
 
 # Flask App and Middleware
 app = Flask(__name__)
-port = int(os.environ.get("PORT", 3000))
-
-# Middleware to authenticate tokens
-def authenticate_token(func):
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        token = extract_auth_token(request)
-        if not token:
-            return send_error_response(request, RESPONSE_STATUS["UNAUTHORIZED"], ERROR_MESSAGES["MISSING_TOKEN"])
-        if token in token_blacklist:
-            return send_error_response(request, RESPONSE_STATUS["FORBIDDEN"], ERROR_MESSAGES["TOKEN_REUSED"])
-        try:
-            decoded = jwt.decode(token, current_secret_key, algorithms=["HS256"])
-            request.user = decoded
-            if request.path != "/protected":
-                token_blacklist.add(token)
-        except jwt.ExpiredSignatureError:
-            return send_error_response(request, RESPONSE_STATUS["UNAUTHORIZED"], ERROR_MESSAGES["TOKEN_EXPIRED"])
-        except jwt.InvalidTokenError:
-            return send_error_response(request, RESPONSE_STATUS["UNAUTHORIZED"], ERROR_MESSAGES["INVALID_TOKEN"])
-        return func(*args, **kwargs)
-    return wrapper
+
+# Endpoints that require a valid token
+PROTECTED_ENDPOINTS = frozenset({"status", "protected"})
+
+# Authenticate the request token, returning an error response on failure
+def authenticate_token() -> Optional[Response]:
+    token = extract_auth_token(request)
+    if not token:
+        return send_error_response(request, STATUS_UNAUTHORIZED, MISSING_TOKEN_MSG, MISSING_TOKEN_BODY)
+    try:
+        decoded = decode_token(token)
+        key = blacklist_key(token, decoded)
+        with token_blacklist_lock:
+            if key in token_blacklist:
+                return send_error_response(request, STATUS_FORBIDDEN, TOKEN_REUSED_MSG, TOKEN_REUSED_BODY)
+            if request.endpoint != "protected":
+                token_blacklist.expire()
+                if token_blacklist.currsize >= token_blacklist.maxsize:
+                    return send_error_response(request, STATUS_UNAVAILABLE, BLACKLIST_FULL_MSG, BLACKLIST_FULL_BODY)
+                token_blacklist[key] = True
+        g.user = decoded
+    except jwt.ExpiredSignatureError:
+        return send_error_response(request, STATUS_UNAUTHORIZED, TOKEN_EXPIRED_MSG, TOKEN_EXPIRED_BODY)
+    except jwt.InvalidTokenError:
+        return send_error_response(request, STATUS_UNAUTHORIZED, INVALID_TOKEN_MSG, INVALID_TOKEN_BODY)
+    return None
+
+# Middleware to authenticate tokens for protected endpoints. Flask answers OPTIONS
+# itself without calling the view, so those requests are not authenticated either.
+@app.before_request
+def require_token() -> Optional[Response]:
+    if request.method != "OPTIONS" and request.endpoint in PROTECTED_ENDPOINTS:
+        return authenticate_token()
+    return None
 
 # Generate a new JWT token
 def generate_token(payload):
-    global current_secret_key, current_token
-    current_secret_key = generate_secret_key()
-    current_token = jwt.encode(payload, current_secret_key, algorithm="HS256")
+    global current_token
+    claims = {
+        **payload,
+        "jti": os.urandom(16).hex(),
+        "exp": int(time.time()) + TOKEN_EXPIRATION_TIME,
+    }
+    current_token = jwt.encode(claims, current_secret_key, algorithm=JWT_ALGORITHM)
     return current_token
 
 # Routes
@@ -109,55 +252,40 @@ def generate_token(payload):
 def login():
     user = {"id": 1, "username": "exampleuser"}
     token = generate_token(user)
-    return jsonify({"token": token})
+    return json_response({"token": token})
 
 @app.route("/refresh", methods=["POST"])
 def refresh():
     token = extract_auth_token(request)
     if not token:
-        return send_error_response(request, RESPONSE_STATUS["UNAUTHORIZED"], ERROR_MESSAGES["MISSING_TOKEN"])
+        return send_error_response(request, STATUS_UNAUTHORIZED, MISSING_TOKEN_MSG, MISSING_TOKEN_BODY)
     try:
-        decoded = jwt.decode(token, current_secret_key, algorithms=["HS256"], options={"verify_exp": False})
+        decoded = verify_hs256(token, current_secret_key, verify_exp=False)
         if not decoded.get("id"):
             return send_error_response(request, 400, "Token is still valid, no need for refresh")
         new_token = generate_token({"id": decoded["id"], "username": decoded["username"]})
-        return jsonify({"token": new_token})
+        return json_response({"token": new_token})
     except jwt.InvalidTokenError:
         pass
 
 @app.route("/protected", methods=["GET"])
-@authenticate_token
 def protected():
-    return jsonify({
+    return json_response({
         "message": "Access granted to protected resource",
-        "user": request.user,
+        "user": g.user,
     })
 
+# Fixed body for the root endpoint, written out as bytes so no encoding happens per request
+HELLO_BODY = b'{"message":"Hello World"}'
+
 @app.route("/", methods=["GET"])
 def index():
-    return jsonify({"message": "Hello World"})
+    return app.response_class(HELLO_BODY, mimetype="application/json")
 
 @app.route("/status", methods=["GET"])
-@authenticate_token
 def status():
-    try:
-        config = load_configuration()
-        metadata = config["metadata"]
-        sha = config["sha"]
-        build_number = os.environ.get("BUILD_NUMBER", "0")
-        global current_token
-        current_token = None
-        return jsonify({
-            "my-application": [
-                {
-                    "description": metadata["description"],
-                    "version": f"{metadata['version']}-{build_number}",
-                    "sha": sha,
-                }
-            ],
-        })
-    except Exception as error:
+    if STATUS_BODY is None:
         return send_error_response(request, 500, "Internal Server Error")
-
-if __name__ == "__main__":
-    app.run(port=port)
\ No newline at end of file
+    global current_token
+    current_token = None
+    return app.response_class(STATUS_BODY, mimetype="application/json")
@@ -0,0 +1,121 @@
+import base64
+import time
+
+import jwt
+import orjson
+import pytest
+
+from auth import base64url_decode, verify_hs256
+
+KEY = b"test-secret-key-that-is-long-enough-for-hs256"
+CLAIMS = {"id": 1, "username": "exampleuser"}
+
+
+def b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def swap_segment(token, index, value):
+    segments = token.split(".")
+    segments[index] = value
+    return ".".join(segments)
+
+
+def test_matches_pyjwt_decode():
+    token = jwt.encode({**CLAIMS, "exp": int(time.time()) + 60}, KEY, algorithm="HS256")
+    assert verify_hs256(token, KEY) == jwt.decode(token, KEY, algorithms=["HS256"])
+
+
+def test_accepts_token_without_exp():
+    token = jwt.encode(CLAIMS, KEY, algorithm="HS256")
+    assert verify_hs256(token, KEY) == CLAIMS
+
+
+def test_rejects_wrong_key():
+    token = jwt.encode(CLAIMS, b"another-secret-key-that-is-long-enough-too", algorithm="HS256")
+    with pytest.raises(jwt.InvalidSignatureError):
+        verify_hs256(token, KEY)
+
+
+def test_rejects_tampered_payload():
+    token = jwt.encode(CLAIMS, KEY, algorithm="HS256")
+    forged = swap_segment(token, 1, b64(orjson.dumps({**CLAIMS, "id": 2})))
+    with pytest.raises(jwt.InvalidSignatureError):
+        verify_hs256(forged, KEY)
+
+
+def test_rejects_tampered_signature():
+    token = jwt.encode(CLAIMS, KEY, algorithm="HS256")
+    signature = bytearray(base64url_decode(token.split(".")[2]))
+    signature[0] ^= 1
+    with pytest.raises(jwt.InvalidSignatureError):
+        verify_hs256(swap_segment(token, 2, b64(bytes(signature))), KEY)
+
+
+@pytest.mark.parametrize("alg", ["none", "HS512", "RS256"])
+def test_rejects_other_algorithms(alg):
+    token = jwt.encode(CLAIMS, KEY, algorithm="HS256")
+    forged = swap_segment(token, 0, b64(orjson.dumps({"alg": alg, "typ": "JWT"})))
+    with pytest.raises(jwt.InvalidAlgorithmError):
+        verify_hs256(forged, KEY)
+
+
+def test_rejects_unsigned_token():
+    token = jwt.encode(CLAIMS, None, algorithm="none")
+    with pytest.raises(jwt.InvalidTokenError):
+        verify_hs256(token, KEY)
+
+
+@pytest.mark.parametrize("token", ["", "a.b", "a.b.c.d", "onlyone"])
+def test_rejects_wrong_segment_count(token):
+    with pytest.raises(jwt.DecodeError):
+        verify_hs256(token, KEY)
+
+
+@pytest.mark.parametrize("index", [0, 1, 2])
+def test_rejects_bad_base64(index):
+    token = jwt.encode(CLAIMS, KEY, algorithm="HS256")
+    with pytest.raises(jwt.InvalidTokenError):
+        verify_hs256(swap_segment(token, index, "!!!"), KEY)
+
+
+def test_rejects_bad_header_json():
+    token = jwt.encode(CLAIMS, KEY, algorithm="HS256")
+    with pytest.raises(jwt.DecodeError):
+        verify_hs256(swap_segment(token, 0, b64(b"{not json")), KEY)
+
+
+def sign(header, payload):
+    signing_input = f"{b64(header)}.{b64(payload)}"
+    signature = jwt.api_jws.get_algorithm_by_name("HS256").sign(signing_input.encode(), KEY)
+    return f"{signing_input}.{b64(signature)}"
+
+
+@pytest.mark.parametrize("payload", [b"{not json", b"[1, 2]", b'"claims"'])
+def test_rejects_signed_non_object_payload(payload):
+    token = sign(b'{"alg":"HS256","typ":"JWT"}', payload)
+    with pytest.raises(jwt.DecodeError):
+        verify_hs256(token, KEY)
+
+
+def test_rejects_non_integer_exp():
+    token = jwt.encode({**CLAIMS, "exp": "later"}, KEY, algorithm="HS256")
+    with pytest.raises(jwt.DecodeError):
+        verify_hs256(token, KEY)
+
+
+def test_rejects_expired_token():
+    token = jwt.encode({**CLAIMS, "exp": int(time.time()) - 10}, KEY, algorithm="HS256")
+    with pytest.raises(jwt.ExpiredSignatureError):
+        verify_hs256(token, KEY)
+    with pytest.raises(jwt.ExpiredSignatureError):
+        jwt.decode(token, KEY, algorithms=["HS256"])
+
+
+def test_refresh_path_skips_exp_but_not_signature():
+    expired = jwt.encode({**CLAIMS, "exp": int(time.time()) - 10}, KEY, algorithm="HS256")
+    expected = jwt.decode(expired, KEY, algorithms=["HS256"], options={"verify_exp": False})
+    assert verify_hs256(expired, KEY, verify_exp=False) == expected
+    forged = swap_segment(expired, 1, b64(orjson.dumps({**CLAIMS, "id": 2})))
+    with pytest.raises(jwt.InvalidSignatureError):
+        verify_hs256(forged, KEY, verify_exp=False)
@@ -0,0 +1,113 @@
+import shutil
+import subprocess
+
+import pytest
+
+import index
+
+SHA = "8a3da16" + "0" * 33
+OTHER_SHA = "1aef20f" + "0" * 33
+
+
+@pytest.fixture(autouse=True)
+def no_env_sha(monkeypatch):
+    monkeypatch.delenv("GIT_SHA", raising=False)
+
+
+def make_git_dir(path, head="ref: refs/heads/main"):
+    path.mkdir(parents=True)
+    (path / "HEAD").write_text(head + "\n")
+    return path
+
+
+def write_ref(git_dir, ref, sha):
+    ref_path = git_dir / ref
+    ref_path.parent.mkdir(parents=True, exist_ok=True)
+    ref_path.write_text(sha + "\n")
+
+
+def test_env_var_wins(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("GIT_SHA", f" {SHA}\n")
+    assert index.get_git_sha() == SHA
+
+
+def test_loose_ref(monkeypatch, tmp_path):
+    git_dir = make_git_dir(tmp_path / ".git")
+    write_ref(git_dir, "refs/heads/main", SHA)
+    (tmp_path / "app").mkdir()
+    monkeypatch.chdir(tmp_path / "app")
+    assert index.get_git_sha() == SHA
+
+
+def test_packed_ref(monkeypatch, tmp_path):
+    git_dir = make_git_dir(tmp_path / ".git")
+    (git_dir / "packed-refs").write_text(
+        "# pack-refs with: peeled fully-peeled sorted\n"
+        f"{OTHER_SHA} refs/heads/other\n"
+        f"{SHA} refs/heads/main\n"
+    )
+    monkeypatch.chdir(tmp_path)
+    assert index.get_git_sha() == SHA
+
+
+def test_detached_head(monkeypatch, tmp_path):
+    make_git_dir(tmp_path / ".git", head=SHA)
+    monkeypatch.chdir(tmp_path)
+    assert index.get_git_sha() == SHA
+
+
+def test_missing_ref(monkeypatch, tmp_path):
+    make_git_dir(tmp_path / ".git")
+    monkeypatch.chdir(tmp_path)
+    assert index.get_git_sha() is None
+
+
+def test_git_file_is_not_skipped_for_parent_repo(monkeypatch, tmp_path):
+    outer = make_git_dir(tmp_path / ".git")
+    write_ref(outer, "refs/heads/main", OTHER_SHA)
+    inner = make_git_dir(tmp_path / "modules" / "nested", head=SHA)
+    checkout = tmp_path / "nested"
+    checkout.mkdir()
+    (checkout / ".git").write_text("gitdir: ../modules/nested\n")
+    monkeypatch.chdir(checkout)
+    assert index.get_git_sha() == SHA
+
+
+def test_worktree_resolves_refs_through_commondir(monkeypatch, tmp_path):
+    common = make_git_dir(tmp_path / "main" / ".git")
+    (common / "packed-refs").write_text(f"{SHA} refs/heads/feature\n")
+    worktree_git_dir = make_git_dir(common / "worktrees" / "feature", head="ref: refs/heads/feature")
+    (worktree_git_dir / "commondir").write_text("../..\n")
+    checkout = tmp_path / "feature"
+    checkout.mkdir()
+    (checkout / ".git").write_text(f"gitdir: {worktree_git_dir}\n")
+    monkeypatch.chdir(checkout)
+    assert index.get_git_sha() == SHA
+
+
+def test_unrecognised_git_file_stops_the_search(monkeypatch, tmp_path):
+    outer = make_git_dir(tmp_path / ".git")
+    write_ref(outer, "refs/heads/main", OTHER_SHA)
+    checkout = tmp_path / "nested"
+    checkout.mkdir()
+    (checkout / ".git").write_text("not a gitdir pointer\n")
+    monkeypatch.chdir(checkout)
+    assert index.get_git_sha() is None
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+def test_matches_git_rev_parse_in_real_worktree(monkeypatch, tmp_path):
+    def git(*args, cwd):
+        return subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    git("init", "-q", "-b", "main", cwd=repo)
+    for message in ("first", "second"):
+        git("-c", "user.name=t", "-c", "user.email=t@t", "commit", "-q", "--allow-empty", "-m", message, cwd=repo)
+    git("worktree", "add", "-q", "-b", "older", str(tmp_path / "older"), "HEAD~1", cwd=repo)
+    git("pack-refs", "--all", cwd=repo)
+    for checkout in (repo, tmp_path / "older"):
+        monkeypatch.chdir(checkout)
+        assert index.get_git_sha() == git("rev-parse", "HEAD", cwd=checkout)
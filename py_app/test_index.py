@@ -0,0 +1,185 @@
+import atexit
+import importlib
+import logging
+import time
+from logging.handlers import QueueHandler
+
+import jwt
+import orjson
+import pytest
+from cachetools import TLRUCache, TTLCache
+
+import index
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(index, "STATUS_BODY", b"{}")
+    monkeypatch.setattr(index, "token_blacklist", TTLCache(maxsize=100, ttl=index.TOKEN_EXPIRATION_TIME))
+    monkeypatch.setattr(index, "jwt_cache", TLRUCache(maxsize=100, ttu=index.jwt_cache_ttu))
+    return index.app.test_client()
+
+
+@pytest.fixture
+def verify_calls(monkeypatch):
+    calls = []
+    verify_hs256 = index.verify_hs256
+
+    def counting_verify(token, key, verify_exp=True):
+        calls.append(token)
+        return verify_hs256(token, key, verify_exp)
+
+    monkeypatch.setattr(index, "verify_hs256", counting_verify)
+    return calls
+
+
+def login(client):
+    token = client.post("/login").json["token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_status_token_is_single_use(client):
+    headers = login(client)
+    assert client.get("/status", headers=headers).status_code == 200
+    response = client.get("/status", headers=headers)
+    assert response.status_code == 403
+    assert response.json == {"error": index.TOKEN_REUSED_MSG}
+
+
+def test_full_blacklist_refuses_tokens_instead_of_evicting(client, monkeypatch):
+    monkeypatch.setattr(index, "token_blacklist", TTLCache(maxsize=2, ttl=index.TOKEN_EXPIRATION_TIME))
+    used = [login(client) for _ in range(2)]
+    for headers in used:
+        assert client.get("/status", headers=headers).status_code == 200
+    response = client.get("/status", headers=login(client))
+    assert response.status_code == 503
+    assert response.json == {"error": index.BLACKLIST_FULL_MSG}
+    for headers in used:
+        assert client.get("/status", headers=headers).status_code == 403
+
+
+@pytest.mark.parametrize("path", ["/status", "/protected"])
+def test_options_does_not_require_token(client, path):
+    assert client.options(path).status_code == 200
+
+
+def test_options_does_not_consume_single_use_token(client):
+    headers = login(client)
+    assert client.options("/status", headers=headers).status_code == 200
+    assert client.get("/status", headers=headers).status_code == 200
+
+
+def test_error_responses_log_through_queue(client):
+    class Records(logging.Handler):
+        def __init__(self):
+            super().__init__()
+            self.messages = []
+
+        def emit(self, record):
+            self.messages.append(record.getMessage())
+
+    records = Records()
+    listener = index.configure_logging(records)
+    try:
+        assert any(isinstance(h, QueueHandler) for h in index.log.handlers)
+        client.get("/status")
+        listener.stop()
+        assert records.messages == [index.MISSING_TOKEN_MSG]
+    finally:
+        atexit.unregister(listener.stop)
+        index.log.handlers.clear()
+        index.log.propagate = True
+
+
+def test_jwt_cache_hit_skips_verification(client, verify_calls):
+    token = index.generate_token({"id": 1, "username": "exampleuser"})
+    decoded = index.decode_token(token)
+    assert index.decode_token(token) == decoded
+    assert verify_calls == [token]
+
+
+def test_jwt_cache_entry_expires_with_token(client, monkeypatch, verify_calls):
+    now = [1_000_000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    monkeypatch.setattr(index, "jwt_cache", TLRUCache(maxsize=100, ttu=index.jwt_cache_ttu, timer=lambda: now[0]))
+    token = jwt.encode({"id": 1, "exp": int(now[0]) + 10}, index.current_secret_key, algorithm="HS256")
+    index.decode_token(token)
+    now[0] += 5
+    index.decode_token(token)
+    assert len(verify_calls) == 1
+    now[0] += 6  # past exp, well inside JWT_CACHE_TTL
+    with pytest.raises(jwt.ExpiredSignatureError):
+        index.decode_token(token)
+    assert len(verify_calls) == 2
+
+
+def test_blacklisted_token_refused_on_jwt_cache_hit(client, verify_calls):
+    headers = login(client)
+    assert client.get("/protected", headers=headers).status_code == 200
+    assert client.get("/status", headers=headers).status_code == 200
+    assert client.get("/status", headers=headers).status_code == 403
+    assert len(verify_calls) == 1
+
+
+@pytest.fixture
+def reload_index(monkeypatch, tmp_path):
+    # Re-run index's import-time configuration against a temporary metadata.json
+    def reload(metadata, **env):
+        (tmp_path / "metadata.json").write_bytes(orjson.dumps(metadata))
+        monkeypatch.chdir(tmp_path)
+        for name in ("GIT_SHA", "BUILD_NUMBER", "JWT_SECRET_KEY"):
+            monkeypatch.delenv(name, raising=False)
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        importlib.reload(index)
+        return index.app.test_client()
+
+    yield reload
+    monkeypatch.undo()
+    importlib.reload(index)
+
+
+def test_status_body_is_built_from_metadata_sha_and_build_number(reload_index):
+    sha = "8a3da16" + "0" * 33
+    client = reload_index({"description": "a service", "version": "2.0.1"}, GIT_SHA=sha, BUILD_NUMBER="42")
+    response = client.get("/status", headers=login(client))
+    assert response.status_code == 200
+    assert response.mimetype == "application/json"
+    assert response.json == {
+        "my-application": [{"description": "a service", "version": "2.0.1-42", "sha": sha}],
+    }
+
+
+def test_status_build_number_defaults_to_zero(reload_index):
+    client = reload_index({"description": "a service", "version": "2.0.1"}, GIT_SHA="abc123")
+    response = client.get("/status", headers=login(client))
+    assert response.json["my-application"][0]["version"] == "2.0.1-0"
+
+
+def test_status_fails_without_version(reload_index):
+    client = reload_index({"description": "a service"}, GIT_SHA="abc123")
+    assert index.STATUS_BODY is None
+    assert client.get("/status", headers=login(client)).status_code == 500
+
+
+def test_login_does_not_invalidate_earlier_tokens(client):
+    first = login(client)
+    second = login(client)
+    assert client.get("/protected", headers=first).status_code == 200
+    assert client.get("/protected", headers=second).status_code == 200
+
+
+def test_signing_key_comes_from_environment(reload_index):
+    secret = "shared-secret-for-every-worker-0123456789"
+    client = reload_index({"description": "a service", "version": "2.0.1"}, JWT_SECRET_KEY=secret)
+    token = client.post("/login").json["token"]
+    assert jwt.decode(token, secret, algorithms=["HS256"])["username"] == "exampleuser"
+    assert client.get("/protected", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+
+
+def test_signing_key_is_random_without_environment(reload_index):
+    reload_index({"description": "a service", "version": "2.0.1"})
+    first_key = index.current_secret_key
+    reload_index({"description": "a service", "version": "2.0.1"})
+    assert len(first_key) == 128
+    assert index.current_secret_key != first_key